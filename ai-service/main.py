@@ -1,8 +1,9 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Dict, Any
 import uvicorn
 import os
 from dotenv import load_dotenv
@@ -10,7 +11,18 @@ import logging
 from datetime import datetime
 import asyncio
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+from schemas import (
+    ChatRequest,
+    ChatResponse,
+    FraudDetectionRequest,
+    FraudDetectionResponse,
+    TransactionAnalysisRequest,
+    TransactionAnalysisResponse,
+    HealthResponse
+)
 from services.chatbot_service import ChatbotService
 from services.fraud_detection_service import FraudDetectionService
 from services.nlp_service import NLPService
@@ -26,13 +38,22 @@ load_dotenv()
 # Setup logging
 logger = setup_logger(__name__)
 
+# Application lifespan
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run service startup and shutdown around the application lifetime"""
+    await startup_event()
+    yield
+    await shutdown_event()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="GlobalAi Payee AI Service",
     description="AI-powered chatbot and fraud detection service",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -47,64 +68,38 @@ app.add_middleware(
 # Security
 security = HTTPBearer()
 
+# Size of the default executor behind asyncio.to_thread (asyncio default is min(32, cpus + 4))
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", 200))
+
 # Initialize services
 chatbot_service = ChatbotService()
 fraud_detection_service = FraudDetectionService()
 nlp_service = NLPService()
 model_service = ModelService()
 
-# Pydantic models
-class ChatRequest(BaseModel):
-    message: str
-    context: Optional[Dict[str, Any]] = None
-    user_id: Optional[str] = None
-    session_id: Optional[str] = None
-
-class ChatResponse(BaseModel):
-    response: str
-    intent: str
-    confidence: float
-    entities: List[Dict[str, Any]]
-    suggestions: List[str]
-    session_id: str
-
-class FraudDetectionRequest(BaseModel):
-    transaction_data: Dict[str, Any]
-    user_id: str
-    amount: float
-    currency: str
-    location: Optional[Dict[str, float]] = None
-    device_info: Optional[Dict[str, Any]] = None
-
-class FraudDetectionResponse(BaseModel):
-    fraud_score: float
-    risk_level: str
-    reasons: List[str]
-    recommendation: str
-    confidence: float
-
-class TransactionAnalysisRequest(BaseModel):
-    transaction_id: str
-    user_id: str
-    transaction_data: Dict[str, Any]
-
-class TransactionAnalysisResponse(BaseModel):
-    category: str
-    confidence: float
-    tags: List[str]
-    insights: List[str]
-    recommendations: List[str]
-
-class HealthResponse(BaseModel):
-    status: str
-    timestamp: datetime
-    services: Dict[str, str]
-    models_loaded: bool
-
 # Health check endpoint
+HEALTH_CACHE_TTL = 1.0  # seconds
+health_cache: Dict[str, Any] = {"expires_at": 0.0, "response": None}
+health_lock = asyncio.Lock()
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
+    # Serve frequent probes from a short-lived cache; only one probe recomputes
+    if time.monotonic() < health_cache["expires_at"]:
+        return health_cache["response"]
+    
+    async with health_lock:
+        if time.monotonic() < health_cache["expires_at"]:
+            return health_cache["response"]
+        
+        response = await compute_health()
+        health_cache["response"] = response
+        health_cache["expires_at"] = time.monotonic() + HEALTH_CACHE_TTL
+        return response
+
+async def compute_health() -> HealthResponse:
+    """Check models and services and build the health response"""
     try:
         # Check if models are loaded
         models_loaded = await model_service.check_models_loaded()
@@ -117,7 +112,7 @@ async def health_check():
             "models": "healthy" if models_loaded else "unhealthy"
         }
         
-        overall_status = "healthy" if all(status == "healthy" for status in services_status.values()) else "degraded"
+        overall_status = "degraded" if "unhealthy" in services_status.values() else "healthy"
         
         return HealthResponse(
             status=overall_status,
@@ -142,17 +137,15 @@ async def chat(
     """Chat with AI assistant"""
     try:
         # Verify token
-        user_data = verify_token(credentials.credentials)
+        user_data = await asyncio.to_thread(verify_token, credentials.credentials)
         
         # Process chat request
-        response = await chatbot_service.process_message(
+        return await chatbot_service.process_message(
             message=request.message,
             context=request.context,
             user_id=request.user_id or user_data.get("userId"),
             session_id=request.session_id
         )
-        
-        return ChatResponse(**response)
     except Exception as e:
         logger.error(f"Chat error: {e}")
         raise HTTPException(
@@ -160,6 +153,35 @@ async def chat(
             detail="Failed to process chat request"
         )
 
+@app.post("/chat/stream")
+@rate_limit(requests_per_minute=30)
+async def chat_stream(
+    request: ChatRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Chat with AI assistant, streaming the response as server-sent events"""
+    try:
+        user_data = await asyncio.to_thread(verify_token, credentials.credentials)
+    except Exception as e:
+        logger.error(f"Chat stream error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to process chat request"
+        )
+    
+    events = chatbot_service.stream_message(
+        message=request.message,
+        context=request.context,
+        user_id=request.user_id or user_data.get("userId"),
+        session_id=request.session_id
+    )
+    
+    async def event_stream():
+        async for event in events:
+            yield f"event: {event.pop('type')}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.post("/chat/intent")
 @rate_limit(requests_per_minute=60)
 async def detect_intent(
@@ -168,9 +190,9 @@ async def detect_intent(
 ):
     """Detect user intent from message"""
     try:
-        verify_token(credentials.credentials)
+        await asyncio.to_thread(verify_token, credentials.credentials)
         
-        intent_data = await nlp_service.detect_intent(request.message)
+        intent_data = await nlp_service.detect_intent(request.message, include_entities=True)
         
         return {
             "intent": intent_data["intent"],
@@ -193,7 +215,7 @@ async def detect_fraud(
 ):
     """Detect fraudulent transactions"""
     try:
-        verify_token(credentials.credentials)
+        await asyncio.to_thread(verify_token, credentials.credentials)
         
         fraud_result = await fraud_detection_service.analyze_transaction(
             transaction_data=request.transaction_data,
@@ -220,19 +242,13 @@ async def batch_analyze_fraud(
 ):
     """Batch analyze multiple transactions for fraud"""
     try:
-        verify_token(credentials.credentials)
+        await asyncio.to_thread(verify_token, credentials.credentials)
         
-        results = []
-        for transaction in transactions:
-            fraud_result = await fraud_detection_service.analyze_transaction(
-                transaction_data=transaction.transaction_data,
-                user_id=transaction.user_id,
-                amount=transaction.amount,
-                currency=transaction.currency,
-                location=transaction.location,
-                device_info=transaction.device_info
-            )
-            results.append(fraud_result)
+        # Request fields map one-to-one onto analyze_transaction's
+        # arguments; dict() is a shallow copy, unlike model_dump()
+        results = await fraud_detection_service.analyze_transactions_batch(
+            [dict(transaction) for transaction in transactions]
+        )
         
         return {"results": results}
     except Exception as e:
@@ -251,7 +267,7 @@ async def analyze_transaction(
 ):
     """Analyze transaction for categorization and insights"""
     try:
-        verify_token(credentials.credentials)
+        await asyncio.to_thread(verify_token, credentials.credentials)
         
         analysis = await nlp_service.analyze_transaction(
             transaction_id=request.transaction_id,
@@ -275,7 +291,7 @@ async def analyze_sentiment(
 ):
     """Analyze sentiment of text"""
     try:
-        verify_token(credentials.credentials)
+        await asyncio.to_thread(verify_token, credentials.credentials)
         
         sentiment = await nlp_service.analyze_sentiment(text)
         
@@ -300,10 +316,9 @@ async def retrain_models(
 ):
     """Retrain AI models"""
     try:
-        verify_token(credentials.credentials)
+        user_data = await asyncio.to_thread(verify_token, credentials.credentials)
         
         # Check if user has admin privileges
-        user_data = verify_token(credentials.credentials)
         if user_data.get("role") != "admin":
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -330,7 +345,7 @@ async def get_model_status(
 ):
     """Get status of AI models"""
     try:
-        verify_token(credentials.credentials)
+        await asyncio.to_thread(verify_token, credentials.credentials)
         
         status = await model_service.get_model_status()
         
@@ -351,7 +366,7 @@ async def extract_entities(
 ):
     """Extract entities from text"""
     try:
-        verify_token(credentials.credentials)
+        await asyncio.to_thread(verify_token, credentials.credentials)
         
         entities = await nlp_service.extract_entities(text)
         
@@ -372,7 +387,7 @@ async def summarize_text(
 ):
     """Summarize text"""
     try:
-        verify_token(credentials.credentials)
+        await asyncio.to_thread(verify_token, credentials.credentials)
         
         summary = await nlp_service.summarize_text(text, max_length)
         
@@ -385,22 +400,29 @@ async def summarize_text(
         )
 
 # Startup event
-@app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
     logger.info("Starting AI Service...")
     
     try:
+        # Size the executor asyncio.to_thread uses for blocking calls such as
+        # token verification and NLP model work
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=THREADPOOL_SIZE)
+        )
+        
         # Initialize database connection
         await get_database()
         
         # Load AI models
         await model_service.load_models()
         
-        # Initialize services
-        await chatbot_service.initialize()
-        await fraud_detection_service.initialize()
-        await nlp_service.initialize()
+        # Initialize services concurrently; they don't depend on each other
+        await asyncio.gather(
+            chatbot_service.initialize(),
+            fraud_detection_service.initialize(),
+            nlp_service.initialize()
+        )
         
         logger.info("AI Service started successfully")
     except Exception as e:
@@ -408,7 +430,6 @@ async def startup_event():
         raise
 
 # Shutdown event
-@app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down AI Service...")
@@ -430,5 +451,8 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8001,
         reload=True if os.getenv("ENVIRONMENT") == "development" else False,
+        workers=int(os.getenv("WORKERS", 1)),
+        loop="uvloop",
+        http="httptools",
         log_level="info"
     )
\ No newline at end of file
@@ -0,0 +1,51 @@
+from pydantic import BaseModel
+from typing import List, Optional, Dict, Any
+from datetime import datetime
+
+# Pydantic models
+class ChatRequest(BaseModel):
+    message: str
+    context: Optional[Dict[str, Any]] = None
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
+
+class ChatResponse(BaseModel):
+    response: str
+    intent: str
+    confidence: float
+    entities: List[Dict[str, Any]]
+    suggestions: List[str]
+    session_id: str
+
+class FraudDetectionRequest(BaseModel):
+    transaction_data: Dict[str, Any]
+    user_id: str
+    amount: float
+    currency: str
+    location: Optional[Dict[str, float]] = None
+    device_info: Optional[Dict[str, Any]] = None
+
+class FraudDetectionResponse(BaseModel):
+    fraud_score: float
+    risk_level: str
+    reasons: List[str]
+    recommendation: str
+    confidence: float
+
+class TransactionAnalysisRequest(BaseModel):
+    transaction_id: str
+    user_id: str
+    transaction_data: Dict[str, Any]
+
+class TransactionAnalysisResponse(BaseModel):
+    category: str
+    confidence: float
+    tags: List[str]
+    insights: List[str]
+    recommendations: List[str]
+
+class HealthResponse(BaseModel):
+    status: str
+    timestamp: datetime
+    services: Dict[str, str]
+    models_loaded: bool
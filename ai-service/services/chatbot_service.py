@@ -1,18 +1,65 @@
 import asyncio
-import json
 import logging
-from typing import Dict, List, Any, Optional
+import re
+import uuid
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
+import httpx
 import openai
 from langchain.llms import OpenAI
 from langchain.chains import ConversationChain
 from langchain.memory import ConversationBufferMemory
 from langchain.prompts import PromptTemplate
-import redis
+from redis.asyncio import Redis
+import orjson
+import ahocorasick
 from database.database import get_database
+from schemas import ChatResponse
 
 logger = logging.getLogger(__name__)
 
+# Entity extraction patterns
+AMOUNT_PATTERN = re.compile(r'\$?(\d+(?:\.\d{2})?)')
+CURRENCY_PATTERN = re.compile(r'\b(USD|EUR|GBP|JPY|INR|CAD|AUD|BTC|ETH)\b')
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+
+# Serialized form of a missing or empty request context
+EMPTY_CONTEXT = "{}"
+
+# Suggestions by intent
+SUGGESTIONS: Dict[str, Tuple[str, ...]] = {
+    "send_money": (
+        "Enter recipient's email or phone number",
+        "Specify the amount to send",
+        "Choose the currency"
+    ),
+    "check_balance": (
+        "View all wallet balances",
+        "Check transaction history",
+        "Set up balance alerts"
+    ),
+    "transaction_history": (
+        "Filter by date range",
+        "Search by amount or recipient",
+        "Export transaction history"
+    ),
+    "currency_conversion": (
+        "Check current exchange rates",
+        "Convert between currencies",
+        "Set up rate alerts"
+    ),
+    "security": (
+        "Enable two-factor authentication",
+        "Review security settings",
+        "Check recent login activity"
+    )
+}
+DEFAULT_SUGGESTIONS: Tuple[str, ...] = (
+    "How can I help you today?",
+    "Need help with payments?",
+    "Want to check your balance?"
+)
+
 class ChatbotService:
     def __init__(self):
         self.openai_client = None
@@ -20,6 +67,9 @@ class ChatbotService:
         self.conversation_chain = None
         self.memory = None
         self.redis_client = None
+        self.intent_automaton = None
+        self.intent_names = ()
+        self.pending_completions: Dict[Tuple[str, str], asyncio.Future] = {}
         self.is_initialized = False
         
         # Chatbot configuration
@@ -42,6 +92,9 @@ class ChatbotService:
         User ID: {user_id}
         """
         
+        # Static part of the system prompt; only the context tail varies per request
+        self.system_prompt_prefix = self.system_prompt[:self.system_prompt.index("Current context:")]
+        
         self.intent_patterns = {
             "send_money": [
                 "send money", "transfer", "pay", "send to", "send cash"
@@ -72,9 +125,18 @@ class ChatbotService:
     async def initialize(self):
         """Initialize the chatbot service"""
         try:
-            # Initialize OpenAI client
-            openai.api_key = os.getenv("OPENAI_API_KEY")
-            self.openai_client = openai
+            # Initialize OpenAI client with a shared, pooled HTTP/2 connection
+            self.openai_client = openai.AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=httpx.AsyncClient(
+                    http2=True,
+                    timeout=30,
+                    limits=httpx.Limits(
+                        max_connections=100,
+                        max_keepalive_connections=50
+                    )
+                )
+            )
             
             # Initialize LangChain
             self.llm = OpenAI(
@@ -102,8 +164,12 @@ class ChatbotService:
                 verbose=True
             )
             
+            # Build intent matcher
+            self.intent_names = tuple(self.intent_patterns)
+            self.intent_automaton = self._build_intent_automaton()
+            
             # Initialize Redis for session management
-            self.redis_client = redis.Redis(
+            self.redis_client = Redis(
                 host=os.getenv("REDIS_HOST", "localhost"),
                 port=int(os.getenv("REDIS_PORT", 6379)),
                 db=0,
@@ -119,7 +185,7 @@ class ChatbotService:
 
     def is_ready(self) -> bool:
         """Check if the service is ready"""
-        return self.is_initialized and self.openai_client is not None
+        return self.is_initialized
 
     async def process_message(
         self, 
@@ -127,7 +193,7 @@ class ChatbotService:
         context: Optional[Dict[str, Any]] = None,
         user_id: Optional[str] = None,
         session_id: Optional[str] = None
-    ) -> Dict[str, Any]:
+    ) -> ChatResponse:
         """Process a chat message and return response"""
         try:
             if not self.is_ready():
@@ -135,7 +201,7 @@ class ChatbotService:
             
             # Generate session ID if not provided
             if not session_id:
-                session_id = f"session_{user_id}_{datetime.now().timestamp()}"
+                session_id = f"session_{user_id or 'anonymous'}_{uuid.uuid4().hex}"
             
             # Detect intent
             intent = await self._detect_intent(message)
@@ -143,11 +209,8 @@ class ChatbotService:
             # Extract entities
             entities = await self._extract_entities(message)
             
-            # Get or create session
-            session_data = await self._get_session(session_id)
-            
             # Prepare context
-            context_str = json.dumps(context or {})
+            context_str = self._serialize_context(context)
             
             # Generate response
             response = await self._generate_response(
@@ -160,13 +223,68 @@ class ChatbotService:
             )
             
             # Update session
-            await self._update_session(session_id, message, response)
+            await self._update_session(session_id)
             
             # Generate suggestions
             suggestions = await self._generate_suggestions(intent, entities)
             
-            return {
-                "response": response,
+            # Built from trusted internal data, so skip validation
+            return ChatResponse.model_construct(
+                response=response,
+                intent=intent,
+                confidence=0.9,  # Placeholder
+                entities=entities,
+                suggestions=list(suggestions),
+                session_id=session_id
+            )
+            
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
+            return ChatResponse.model_construct(
+                response="I'm sorry, I encountered an error. Please try again or contact support.",
+                intent="error",
+                confidence=0.0,
+                entities=[],
+                suggestions=["Contact support", "Try again"],
+                session_id=session_id or "error"
+            )
+
+    async def stream_message(
+        self,
+        message: str,
+        context: Optional[Dict[str, Any]] = None,
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Process a chat message, yielding response tokens as they are generated.
+        
+        Yields ``{"type": "token", "content": ...}`` events followed by a final
+        ``{"type": "done", ...}`` event carrying intent, entities and suggestions,
+        or a single ``{"type": "error", ...}`` event on failure.
+        """
+        # Generate session ID if not provided
+        if not session_id:
+            session_id = f"session_{user_id or 'anonymous'}_{uuid.uuid4().hex}"
+        
+        try:
+            if not self.is_ready():
+                raise Exception("Chatbot service not initialized")
+            
+            intent = await self._detect_intent(message)
+            entities = await self._extract_entities(message)
+            
+            system_content = self._build_system_prompt(
+                self._serialize_context(context), user_id or "anonymous"
+            )
+            
+            async for content in self._stream_completion(system_content, message):
+                yield {"type": "token", "content": content}
+            
+            await self._update_session(session_id)
+            suggestions = await self._generate_suggestions(intent, entities)
+            
+            yield {
+                "type": "done",
                 "intent": intent,
                 "confidence": 0.9,  # Placeholder
                 "entities": entities,
@@ -175,37 +293,50 @@ class ChatbotService:
             }
             
         except Exception as e:
-            logger.error(f"Error processing message: {e}")
-            return {
+            logger.error(f"Error streaming message: {e}")
+            yield {
+                "type": "error",
                 "response": "I'm sorry, I encountered an error. Please try again or contact support.",
-                "intent": "error",
-                "confidence": 0.0,
-                "entities": [],
-                "suggestions": ["Contact support", "Try again"],
-                "session_id": session_id or "error"
+                "session_id": session_id
             }
 
+    def _build_intent_automaton(self) -> ahocorasick.Automaton:
+        """Build an Aho-Corasick automaton over all intent patterns"""
+        automaton = ahocorasick.Automaton()
+        
+        # Patterns map to the index of their intent so that, as before,
+        # earlier intents take precedence when several patterns match
+        for priority, patterns in enumerate(self.intent_patterns.values()):
+            for pattern in patterns:
+                if pattern not in automaton:
+                    automaton.add_word(pattern, priority)
+        
+        automaton.make_automaton()
+        return automaton
+
     async def _detect_intent(self, message: str) -> str:
         """Detect user intent from message"""
-        message_lower = message.lower()
+        best = None
         
-        for intent, patterns in self.intent_patterns.items():
-            for pattern in patterns:
-                if pattern in message_lower:
-                    return intent
+        for _, priority in self.intent_automaton.iter(message.lower()):
+            if best is None or priority < best:
+                best = priority
+                if best == 0:
+                    break
         
-        return "general"
+        if best is None:
+            return "general"
+        
+        return self.intent_names[best]
 
     async def _extract_entities(self, message: str) -> List[Dict[str, Any]]:
         """Extract entities from message"""
         entities = []
         
         # Simple entity extraction (in production, use spaCy or similar)
-        import re
         
         # Extract amounts
-        amount_pattern = r'\$?(\d+(?:\.\d{2})?)'
-        amounts = re.findall(amount_pattern, message)
+        amounts = AMOUNT_PATTERN.findall(message)
         for amount in amounts:
             entities.append({
                 "type": "amount",
@@ -214,8 +345,7 @@ class ChatbotService:
             })
         
         # Extract currencies
-        currency_pattern = r'\b(USD|EUR|GBP|JPY|INR|CAD|AUD|BTC|ETH)\b'
-        currencies = re.findall(currency_pattern, message.upper())
+        currencies = CURRENCY_PATTERN.findall(message.upper())
         for currency in currencies:
             entities.append({
                 "type": "currency",
@@ -224,8 +354,7 @@ class ChatbotService:
             })
         
         # Extract email addresses
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        emails = re.findall(email_pattern, message)
+        emails = EMAIL_PATTERN.findall(message)
         for email in emails:
             entities.append({
                 "type": "email",
@@ -246,127 +375,102 @@ class ChatbotService:
     ) -> str:
         """Generate AI response"""
         try:
-            # Prepare context for the AI
-            context_info = {
-                "user_id": user_id,
-                "session_id": session_id,
-                "intent": intent,
-                "entities": entities,
-                "timestamp": datetime.now().isoformat()
-            }
+            system_content = self._build_system_prompt(context, user_id)
             
-            # Use OpenAI API for response generation
-            response = await self.openai_client.ChatCompletion.acreate(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self.system_prompt.format(
-                            context=context,
-                            user_id=user_id
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": message
-                    }
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
+            # Identical prompts already in flight share a single upstream call
+            key = (system_content, message)
+            completion = self.pending_completions.get(key)
+            if completion is None:
+                completion = asyncio.ensure_future(
+                    self._create_completion(system_content, message)
+                )
+                self.pending_completions[key] = completion
+                completion.add_done_callback(
+                    lambda _: self.pending_completions.pop(key, None)
+                )
             
-            return response.choices[0].message.content.strip()
+            # Shield so one cancelled caller doesn't cancel the others
+            return await asyncio.shield(completion)
             
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             return "I'm sorry, I'm having trouble processing your request right now. Please try again later."
 
-    async def _generate_suggestions(self, intent: str, entities: List[Dict[str, Any]]) -> List[str]:
-        """Generate helpful suggestions based on intent and entities"""
-        suggestions = []
+    def _serialize_context(self, context: Optional[Dict[str, Any]]) -> str:
+        """Serialize request context for the system prompt"""
+        if not context:
+            return EMPTY_CONTEXT
+        return orjson.dumps(context).decode()
+
+    def _build_system_prompt(self, context: str, user_id: str) -> str:
+        """Build the system prompt for a request"""
+        return f"{self.system_prompt_prefix}Current context: {context}\nUser ID: {user_id}"
+
+    def _build_messages(self, system_content: str, message: str) -> List[Dict[str, str]]:
+        """Build the OpenAI messages list for a request"""
+        return [
+            {
+                "role": "system",
+                "content": system_content
+            },
+            {
+                "role": "user",
+                "content": message
+            }
+        ]
+
+    async def _create_completion(self, system_content: str, message: str) -> str:
+        """Request a chat completion from OpenAI"""
+        response = await self.openai_client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=self._build_messages(system_content, message),
+            max_tokens=500,
+            temperature=0.7
+        )
         
-        if intent == "send_money":
-            suggestions = [
-                "Enter recipient's email or phone number",
-                "Specify the amount to send",
-                "Choose the currency"
-            ]
-        elif intent == "check_balance":
-            suggestions = [
-                "View all wallet balances",
-                "Check transaction history",
-                "Set up balance alerts"
-            ]
-        elif intent == "transaction_history":
-            suggestions = [
-                "Filter by date range",
-                "Search by amount or recipient",
-                "Export transaction history"
-            ]
-        elif intent == "currency_conversion":
-            suggestions = [
-                "Check current exchange rates",
-                "Convert between currencies",
-                "Set up rate alerts"
-            ]
-        elif intent == "security":
-            suggestions = [
-                "Enable two-factor authentication",
-                "Review security settings",
-                "Check recent login activity"
-            ]
-        else:
-            suggestions = [
-                "How can I help you today?",
-                "Need help with payments?",
-                "Want to check your balance?"
-            ]
+        return response.choices[0].message.content.strip()
+
+    async def _stream_completion(self, system_content: str, message: str) -> AsyncIterator[str]:
+        """Stream a chat completion from OpenAI, yielding content deltas"""
+        response = await self.openai_client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=self._build_messages(system_content, message),
+            max_tokens=500,
+            temperature=0.7,
+            stream=True
+        )
         
-        return suggestions
+        async for chunk in response:
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
 
-    async def _get_session(self, session_id: str) -> Dict[str, Any]:
-        """Get or create session data"""
-        try:
-            session_data = self.redis_client.get(f"chat_session:{session_id}")
-            if session_data:
-                return json.loads(session_data)
-            else:
-                return {
-                    "session_id": session_id,
-                    "created_at": datetime.now().isoformat(),
-                    "message_count": 0,
-                    "context": {}
-                }
-        except Exception as e:
-            logger.error(f"Error getting session: {e}")
-            return {
-                "session_id": session_id,
-                "created_at": datetime.now().isoformat(),
-                "message_count": 0,
-                "context": {}
-            }
+    async def _generate_suggestions(self, intent: str, entities: List[Dict[str, Any]]) -> Tuple[str, ...]:
+        """Generate helpful suggestions based on intent and entities"""
+        return SUGGESTIONS.get(intent, DEFAULT_SUGGESTIONS)
 
-    async def _update_session(self, session_id: str, message: str, response: str):
+    async def _update_session(self, session_id: str):
         """Update session data"""
         try:
-            session_data = await self._get_session(session_id)
-            session_data["message_count"] += 1
-            session_data["last_activity"] = datetime.now().isoformat()
+            session_key = f"chat_session:{session_id}"
+            now = datetime.now().isoformat()
             
-            # Store in Redis with 24-hour expiration
-            self.redis_client.setex(
-                f"chat_session:{session_id}",
-                86400,  # 24 hours
-                json.dumps(session_data)
-            )
+            # Sessions are Redis hashes so the counter can be bumped in place
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hsetnx(session_key, "session_id", session_id)
+                pipe.hsetnx(session_key, "created_at", now)
+                pipe.hincrby(session_key, "message_count", 1)
+                pipe.hset(session_key, "last_activity", now)
+                pipe.expire(session_key, 86400)  # 24 hours
+                await pipe.execute()
         except Exception as e:
             logger.error(f"Error updating session: {e}")
 
     async def get_conversation_history(self, session_id: str) -> List[Dict[str, Any]]:
         """Get conversation history for a session"""
         try:
-            history = self.redis_client.lrange(f"chat_history:{session_id}", 0, -1)
-            return [json.loads(msg) for msg in history]
+            history = await self.redis_client.lrange(f"chat_history:{session_id}", 0, -1)
+            return [orjson.loads(msg) for msg in history]
         except Exception as e:
             logger.error(f"Error getting conversation history: {e}")
             return []
@@ -374,16 +478,21 @@ class ChatbotService:
     async def clear_session(self, session_id: str):
         """Clear session data"""
         try:
-            self.redis_client.delete(f"chat_session:{session_id}")
-            self.redis_client.delete(f"chat_history:{session_id}")
+            await self.redis_client.delete(
+                f"chat_session:{session_id}",
+                f"chat_history:{session_id}"
+            )
         except Exception as e:
             logger.error(f"Error clearing session: {e}")
 
     async def cleanup(self):
         """Cleanup resources"""
         try:
+            self.is_initialized = False
+            if self.openai_client:
+                await self.openai_client.close()
             if self.redis_client:
-                self.redis_client.close()
+                await self.redis_client.aclose()
             logger.info("Chatbot service cleaned up")
         except Exception as e:
             logger.error(f"Error during cleanup: {e}")
@@ -1,25 +1,132 @@
 import asyncio
 import logging
 import re
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import spacy
-import nltk
-from textblob import TextBlob
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
+from spacy.attrs import LEMMA, POS, IS_STOP, IS_PUNCT, LENGTH
+from spacy.parts_of_speech import NOUN, ADJ, PROPN
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
 import numpy as np
+import ahocorasick
+from numba import njit
 import json
 from datetime import datetime
+from cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# Custom entity patterns
+AMOUNT_PATTERN = re.compile(r'\$?(\d+(?:\.\d{2})?)')
+CURRENCY_PATTERN = re.compile(r'\b(USD|EUR|GBP|JPY|INR|CAD|AUD|BTC|ETH|MATIC)\b', re.IGNORECASE)
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+PHONE_PATTERN = re.compile(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b')
+
+# Transaction text tags; each group name is the tag its keywords produce
+TAG_PATTERN = re.compile(
+    r'(?P<online>online|internet|web)'
+    r'|(?P<recurring>recurring|subscription|monthly)'
+    r'|(?P<refund>refund|return|credit)'
+    r'|(?P<fee>fee|charge|cost)'
+)
+TAG_NAMES = tuple(TAG_PATTERN.groupindex)
+
+# Common words used for language detection
+WORD_PATTERN = re.compile(r"[a-zà-ÿ]+")
+ENGLISH_WORDS = frozenset({'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'})
+SPANISH_WORDS = frozenset({'el', 'la', 'de', 'que', 'y', 'a', 'en', 'un', 'es', 'se', 'no', 'te', 'lo', 'le'})
+FRENCH_WORDS = frozenset({'le', 'la', 'de', 'et', 'à', 'un', 'il', 'être', 'en', 'avoir', 'que', 'pour'})
+
+# Insights and recommendations by transaction category
+CATEGORY_INSIGHTS: Dict[str, Tuple[str, ...]] = {
+    "food_dining": ("Dining expense - consider budgeting for meals",),
+    "transportation": ("Transportation cost - track for tax deductions",),
+    "entertainment": ("Entertainment expense - monitor discretionary spending",),
+}
+CATEGORY_RECOMMENDATIONS: Dict[str, Tuple[str, ...]] = {
+    "food_dining": ("Consider setting a monthly budget for this category",),
+    "entertainment": ("Consider setting a monthly budget for this category",),
+}
+
+# Hours outside 06:00-22:59 count as late night
+LATE_HOURS = frozenset({23, 0, 1, 2, 3, 4, 5})
+
+# Texts per spaCy pipe batch
+NLP_BATCH_SIZE = 64
+
+# Pipeline components each analysis can skip
+INTENT_DISABLED_PIPES = ["tagger", "parser", "attribute_ruler", "lemmatizer"]
+KEYWORD_DISABLED_PIPES = ["ner", "parser"]
+
+# Token attributes read for keyword extraction, and the parts of speech kept
+KEYWORD_ATTRS = [LEMMA, POS, IS_STOP, IS_PUNCT, LENGTH]
+KEYWORD_POS = np.array([NOUN, ADJ, PROPN], dtype=np.uint64)
+
+
+@njit(cache=True)
+def score_categories(keyword_ids, offsets, n_tokens, keyword_categories):
+    """Pick the best category and its confidence for each row of matched keyword IDs"""
+    n = offsets.shape[0] - 1
+    n_keywords, n_categories = keyword_categories.shape
+    best_categories = np.empty(n, dtype=np.int64)
+    confidences = np.empty(n, dtype=np.float64)
+    scores = np.empty(n_categories, dtype=np.int64)
+    seen = np.full(n_keywords, -1, dtype=np.int64)
+    
+    for i in range(n):
+        scores[:] = 0
+        
+        # A keyword counts once per row however often it matched
+        for j in range(offsets[i], offsets[i + 1]):
+            keyword = keyword_ids[j]
+            if seen[keyword] == i:
+                continue
+            seen[keyword] = i
+            for c in range(n_categories):
+                scores[c] += keyword_categories[keyword, c]
+        
+        # Earliest category wins ties
+        best = 0
+        for c in range(1, n_categories):
+            if scores[c] > scores[best]:
+                best = c
+        
+        best_categories[i] = best
+        if n_tokens[i] > 0:
+            confidences[i] = min(scores[best] / n_tokens[i], 1.0)
+        else:
+            confidences[i] = 0.0
+    
+    return best_categories, confidences
+
 class NLPService:
     def __init__(self):
         self.nlp = None
-        self.vectorizer = None
-        self.kmeans = None
+        self.sentence_nlp = None
+        self.intent_automaton = None
+        self.category_automaton = None
+        self.category_names = ()
+        self.category_keyword_matrix = None
+        self.label_descriptions: Dict[str, Optional[str]] = {}
+        self.sentiment_analyzer = None
         self.is_initialized = False
         
+        # In-process LRU caches of results for short, frequently repeated texts
+        self.memo_max_text_length = 256
+        self.intent_cache = LRUCache(max_size=10000)
+        self.category_cache = LRUCache(max_size=10000)
+        self.language_cache = LRUCache(max_size=10000)
+        
+        # Intent keywords
+        self.intents = {
+            "send_money": ["send", "transfer", "pay", "give"],
+            "receive_money": ["receive", "get", "collect", "earn"],
+            "check_balance": ["balance", "amount", "money", "funds"],
+            "transaction_history": ["history", "transactions", "past", "previous"],
+            "help": ["help", "support", "assist", "guide"],
+            "security": ["security", "safe", "secure", "protect"],
+            "currency": ["currency", "exchange", "convert", "rate"]
+        }
+        
         # Transaction categories
         self.transaction_categories = {
             "food_dining": ["restaurant", "food", "dining", "cafe", "coffee", "lunch", "dinner"],
@@ -37,18 +144,24 @@ class NLPService:
     async def initialize(self):
         """Initialize the NLP service"""
         try:
-            # Load spaCy model
-            self.nlp = spacy.load("en_core_web_sm")
-            
-            # Initialize TF-IDF vectorizer
-            self.vectorizer = TfidfVectorizer(
-                max_features=1000,
-                stop_words='english',
-                ngram_range=(1, 2)
-            )
+            # Load the spaCy and VADER models off the event loop
+            await asyncio.to_thread(self._load_models)
+            
+            # Cache entity label descriptions
+            self.label_descriptions = {
+                label: spacy.explain(label) for label in self.nlp.get_pipe("ner").labels
+            }
+            
+            # Build keyword automata for intent and category scoring
+            self.intent_automaton = self._build_keyword_automaton(self.intents)
+            self.category_automaton = self._build_keyword_automaton(self.transaction_categories)
             
-            # Initialize K-means for text clustering
-            self.kmeans = KMeans(n_clusters=10, random_state=42)
+            # Keyword-to-category matrix for bulk categorization
+            self.category_names = tuple(self.transaction_categories)
+            self.category_keyword_matrix = self._build_keyword_matrix(self.transaction_categories)
+            
+            # Compile the bulk scoring kernel now rather than on the first request
+            await asyncio.to_thread(self._score_category_batch, ["warm up"])
             
             self.is_initialized = True
             logger.info("NLP service initialized successfully")
@@ -57,69 +170,161 @@ class NLPService:
             logger.error(f"Failed to initialize NLP service: {e}")
             raise
 
+    def _load_models(self):
+        """Load the spaCy pipelines and the VADER sentiment lexicon"""
+        # Load spaCy model
+        self.nlp = spacy.load("en_core_web_sm")
+        
+        # Rule-based sentence splitting for summaries; no model components needed
+        self.sentence_nlp = spacy.blank("en")
+        self.sentence_nlp.add_pipe("sentencizer")
+        
+        # Load the VADER lexicon for sentiment scoring
+        self.sentiment_analyzer = SentimentIntensityAnalyzer()
+
     def is_ready(self) -> bool:
         """Check if the service is ready"""
-        return self.is_initialized and self.nlp is not None
+        # is_initialized is only set once the spaCy model has loaded
+        return self.is_initialized
+
+    def _pipe(self, texts: List[str], disable: List[str]) -> List[Any]:
+        """Run texts through the spaCy pipeline without the disabled components"""
+        return list(self.nlp.pipe(texts, batch_size=NLP_BATCH_SIZE, disable=disable))
+
+    def _group_keywords(self, buckets: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """Map each keyword to the buckets listing it"""
+        keyword_buckets: Dict[str, List[str]] = {}
+        for bucket, keywords in buckets.items():
+            for keyword in keywords:
+                keyword_buckets.setdefault(keyword, []).append(bucket)
+        return keyword_buckets
 
-    async def detect_intent(self, text: str) -> Dict[str, Any]:
+    def _build_keyword_automaton(self, buckets: Dict[str, List[str]]) -> ahocorasick.Automaton:
+        """Build an Aho-Corasick automaton mapping each keyword to its ID and buckets"""
+        automaton = ahocorasick.Automaton()
+        for keyword_id, (keyword, names) in enumerate(self._group_keywords(buckets).items()):
+            automaton.add_word(keyword, (keyword_id, tuple(names)))
+        
+        automaton.make_automaton()
+        return automaton
+
+    def _build_keyword_matrix(self, buckets: Dict[str, List[str]]) -> np.ndarray:
+        """Build a keyword ID by bucket matrix marking which buckets list each keyword"""
+        bucket_index = {bucket: i for i, bucket in enumerate(buckets)}
+        keyword_buckets = self._group_keywords(buckets)
+        
+        matrix = np.zeros((len(keyword_buckets), len(buckets)), dtype=np.int64)
+        for keyword_id, names in enumerate(keyword_buckets.values()):
+            for name in names:
+                matrix[keyword_id, bucket_index[name]] = 1
+        
+        return matrix
+
+    def _score_keywords(
+        self,
+        automaton: ahocorasick.Automaton,
+        buckets: Dict[str, List[str]],
+        text: str
+    ) -> Tuple[str, int]:
+        """Return the bucket matching the most distinct keywords in text, with its score"""
+        scores = dict.fromkeys(buckets, 0)
+        seen = set()
+        
+        # One pass over the text; a keyword counts once however often it occurs
+        for _, (keyword_id, names) in automaton.iter(text):
+            if keyword_id in seen:
+                continue
+            seen.add(keyword_id)
+            for name in names:
+                scores[name] += 1
+        
+        # Earliest bucket wins ties
+        best_bucket, best_score = None, -1
+        for bucket, score in scores.items():
+            if score > best_score:
+                best_bucket, best_score = bucket, score
+        
+        return best_bucket, best_score
+
+    async def detect_intent(self, text: str, include_entities: bool = False) -> Dict[str, Any]:
         """Detect intent from text"""
+        return (await self.detect_intents_batch([text], include_entities))[0]
+
+    async def detect_intents_batch(
+        self,
+        texts: List[str],
+        include_entities: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Detect intents for multiple texts, running spaCy only when entities are requested"""
         try:
-            if not self.is_ready():
+            if not self.is_initialized:
                 raise Exception("NLP service not initialized")
             
-            doc = self.nlp(text.lower())
-            
-            # Simple intent detection based on keywords
-            intents = {
-                "send_money": ["send", "transfer", "pay", "give"],
-                "receive_money": ["receive", "get", "collect", "earn"],
-                "check_balance": ["balance", "amount", "money", "funds"],
-                "transaction_history": ["history", "transactions", "past", "previous"],
-                "help": ["help", "support", "assist", "guide"],
-                "security": ["security", "safe", "secure", "protect"],
-                "currency": ["currency", "exchange", "convert", "rate"]
-            }
-            
-            intent_scores = {}
-            for intent, keywords in intents.items():
-                score = sum(1 for keyword in keywords if keyword in text.lower())
-                intent_scores[intent] = score
-            
-            # Get the intent with highest score
-            best_intent = max(intent_scores, key=intent_scores.get) if intent_scores else "general"
-            confidence = intent_scores[best_intent] / len(text.split()) if text.split() else 0
-            
-            # Extract entities
-            entities = []
-            for ent in doc.ents:
-                entities.append({
-                    "text": ent.text,
-                    "label": ent.label_,
-                    "start": ent.start_char,
-                    "end": ent.end_char
-                })
+            texts_lower = [text.lower() for text in texts]
+            results = [
+                self.intent_cache.get((text_lower, include_entities))
+                if len(text_lower) <= self.memo_max_text_length else None
+                for text_lower in texts_lower
+            ]
+            
+            # Only texts without a memoized result are scored; intent keywords
+            # need no pipeline, so spaCy runs only to find entities
+            misses = [i for i, result in enumerate(results) if result is None]
+            if misses:
+                if include_entities:
+                    docs = await asyncio.to_thread(
+                        self._pipe, [texts_lower[i] for i in misses], INTENT_DISABLED_PIPES
+                    )
+                else:
+                    docs = [None] * len(misses)
+                
+                for i, doc in zip(misses, docs):
+                    results[i] = self._score_intent(texts_lower[i], doc)
+                    if len(texts_lower[i]) <= self.memo_max_text_length:
+                        self.intent_cache.set((texts_lower[i], include_entities), results[i])
             
-            return {
-                "intent": best_intent,
-                "confidence": min(confidence, 1.0),
-                "entities": entities
-            }
+            return results
             
         except Exception as e:
             logger.error(f"Error detecting intent: {e}")
-            return {
+            return [{
                 "intent": "general",
                 "confidence": 0.0,
                 "entities": []
-            }
+            } for _ in texts]
+
+    def _score_intent(self, text_lower: str, doc=None) -> Dict[str, Any]:
+        """Score intents for lowercased text and collect the entities of its doc, if any"""
+        # Simple intent detection based on keywords
+        best_intent, best_score = self._score_keywords(
+            self.intent_automaton, self.intents, text_lower
+        )
+        n_tokens = len(text_lower.split())
+        confidence = best_score / n_tokens if n_tokens else 0
+        
+        # Extract entities
+        entities = []
+        for ent in (doc.ents if doc is not None else ()):
+            entities.append({
+                "text": ent.text,
+                "label": ent.label_,
+                "start": ent.start_char,
+                "end": ent.end_char
+            })
+        
+        return {
+            "intent": best_intent,
+            "confidence": min(confidence, 1.0),
+            "entities": entities
+        }
 
     async def extract_entities(self, text: str) -> List[Dict[str, Any]]:
         """Extract entities from text"""
         try:
-            if not self.is_ready():
+            if not self.is_initialized:
                 raise Exception("NLP service not initialized")
             
-            doc = self.nlp(text)
+            doc = await asyncio.to_thread(self.nlp, text)
             entities = []
             
             for ent in doc.ents:
@@ -128,7 +333,7 @@ class NLPService:
                     "label": ent.label_,
                     "start": ent.start_char,
                     "end": ent.end_char,
-                    "description": spacy.explain(ent.label_)
+                    "description": self.label_descriptions.get(ent.label_)
                 })
             
             # Extract custom entities (amounts, currencies, etc.)
@@ -146,50 +351,42 @@ class NLPService:
         entities = []
         
         # Extract amounts
-        amount_pattern = r'\$?(\d+(?:\.\d{2})?)'
-        amounts = re.findall(amount_pattern, text)
-        for amount in amounts:
+        for match in AMOUNT_PATTERN.finditer(text):
             entities.append({
-                "text": amount,
+                "text": match.group(1),
                 "label": "MONEY",
-                "start": text.find(amount),
-                "end": text.find(amount) + len(amount),
+                "start": match.start(1),
+                "end": match.end(1),
                 "description": "Monetary amount"
             })
         
         # Extract currencies
-        currency_pattern = r'\b(USD|EUR|GBP|JPY|INR|CAD|AUD|BTC|ETH|MATIC)\b'
-        currencies = re.findall(currency_pattern, text.upper())
-        for currency in currencies:
+        for match in CURRENCY_PATTERN.finditer(text):
             entities.append({
-                "text": currency,
+                "text": match.group(1).upper(),
                 "label": "CURRENCY",
-                "start": text.upper().find(currency),
-                "end": text.upper().find(currency) + len(currency),
+                "start": match.start(1),
+                "end": match.end(1),
                 "description": "Currency code"
             })
         
         # Extract email addresses
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        emails = re.findall(email_pattern, text)
-        for email in emails:
+        for match in EMAIL_PATTERN.finditer(text):
             entities.append({
-                "text": email,
+                "text": match.group(),
                 "label": "EMAIL",
-                "start": text.find(email),
-                "end": text.find(email) + len(email),
+                "start": match.start(),
+                "end": match.end(),
                 "description": "Email address"
             })
         
         # Extract phone numbers
-        phone_pattern = r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'
-        phones = re.findall(phone_pattern, text)
-        for phone in phones:
+        for match in PHONE_PATTERN.finditer(text):
             entities.append({
-                "text": phone,
+                "text": match.group(),
                 "label": "PHONE",
-                "start": text.find(phone),
-                "end": text.find(phone) + len(phone),
+                "start": match.start(),
+                "end": match.end(),
                 "description": "Phone number"
             })
         
@@ -198,9 +395,7 @@ class NLPService:
     async def analyze_sentiment(self, text: str) -> Dict[str, Any]:
         """Analyze sentiment of text"""
         try:
-            blob = TextBlob(text)
-            polarity = blob.sentiment.polarity
-            subjectivity = blob.sentiment.subjectivity
+            polarity, subjectivity = await asyncio.to_thread(self._score_sentiment, text)
             
             # Determine sentiment label
             if polarity > 0.1:
@@ -230,6 +425,14 @@ class NLPService:
                 }
             }
 
+    def _score_sentiment(self, text: str) -> Tuple[float, float]:
+        """Return polarity and subjectivity for text from the VADER lexicon"""
+        scores = self.sentiment_analyzer.polarity_scores(text)
+        
+        # Compound score is the polarity; the share of text carrying
+        # sentiment stands in for subjectivity
+        return scores["compound"], 1.0 - scores["neu"]
+
     async def categorize_transaction(
         self,
         description: str,
@@ -238,34 +441,39 @@ class NLPService:
     ) -> Dict[str, Any]:
         """Categorize transaction based on description"""
         try:
-            if not self.is_ready():
+            if not self.is_initialized:
                 raise Exception("NLP service not initialized")
             
             # Combine description and merchant for analysis
             text = f"{description} {merchant or ''}".lower()
             
-            # Calculate category scores
-            category_scores = {}
-            for category, keywords in self.transaction_categories.items():
-                score = sum(1 for keyword in keywords if keyword in text)
-                category_scores[category] = score
+            # Tags only depend on the amount through the value thresholds
+            memoize = len(text) <= self.memo_max_text_length
+            cache_key = (text, amount > 1000, amount < 10)
+            if memoize:
+                result = self.category_cache.get(cache_key)
+                if result is not None:
+                    return result
             
             # Get the category with highest score
-            if category_scores:
-                best_category = max(category_scores, key=category_scores.get)
-                confidence = category_scores[best_category] / len(text.split()) if text.split() else 0
-            else:
-                best_category = "other"
-                confidence = 0.0
+            best_category, best_score = self._score_keywords(
+                self.category_automaton, self.transaction_categories, text
+            )
+            n_tokens = len(text.split())
+            confidence = best_score / n_tokens if n_tokens else 0
             
             # Generate tags
             tags = self._generate_tags(text, amount)
             
-            return {
+            result = {
                 "category": best_category,
                 "confidence": min(confidence, 1.0),
                 "tags": tags
             }
+            if memoize:
+                self.category_cache.set(cache_key, result)
+            
+            return result
             
         except Exception as e:
             logger.error(f"Error categorizing transaction: {e}")
@@ -275,6 +483,67 @@ class NLPService:
                 "tags": []
             }
 
+    async def categorize_batch(
+        self,
+        descriptions: List[str],
+        amounts: List[float],
+        merchants: Optional[List[Optional[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Categorize many transactions, scoring categories in one compiled pass"""
+        try:
+            if not self.is_initialized:
+                raise Exception("NLP service not initialized")
+            
+            merchants = merchants if merchants is not None else [None] * len(descriptions)
+            if not len(descriptions) == len(amounts) == len(merchants):
+                raise ValueError(
+                    f"got {len(descriptions)} descriptions, "
+                    f"{len(amounts)} amounts and {len(merchants)} merchants"
+                )
+            
+            texts = [
+                f"{description} {merchant or ''}".lower()
+                for description, merchant in zip(descriptions, merchants)
+            ]
+            
+            best_categories, confidences = await asyncio.to_thread(
+                self._score_category_batch, texts
+            )
+            
+            return [{
+                "category": self.category_names[best],
+                "confidence": confidence,
+                "tags": self._generate_tags(text, amount)
+            } for text, amount, best, confidence in zip(
+                texts, amounts, best_categories.tolist(), confidences.tolist()
+            )]
+            
+        except Exception as e:
+            logger.error(f"Error categorizing transactions: {e}")
+            return [{
+                "category": "other",
+                "confidence": 0.0,
+                "tags": []
+            } for _ in descriptions]
+
+    def _score_category_batch(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the best category index and confidence for each lowercased text"""
+        # Flatten matched keyword IDs into one array with per-row offsets
+        keyword_ids = []
+        offsets = [0]
+        for text in texts:
+            keyword_ids.extend(
+                keyword_id for _, (keyword_id, _) in self.category_automaton.iter(text)
+            )
+            offsets.append(len(keyword_ids))
+        
+        return score_categories(
+            np.array(keyword_ids, dtype=np.int64),
+            np.array(offsets, dtype=np.int64),
+            np.array([len(text.split()) for text in texts], dtype=np.int64),
+            self.category_keyword_matrix
+        )
+
     def _generate_tags(self, text: str, amount: float) -> List[str]:
         """Generate tags for transaction"""
         tags = []
@@ -286,17 +555,8 @@ class NLPService:
             tags.append("low-value")
         
         # Text-based tags
-        if any(word in text for word in ["online", "internet", "web"]):
-            tags.append("online")
-        
-        if any(word in text for word in ["recurring", "subscription", "monthly"]):
-            tags.append("recurring")
-        
-        if any(word in text for word in ["refund", "return", "credit"]):
-            tags.append("refund")
-        
-        if any(word in text for word in ["fee", "charge", "cost"]):
-            tags.append("fee")
+        matched = {match.lastgroup for match in TAG_PATTERN.finditer(text)}
+        tags.extend(tag for tag in TAG_NAMES if tag in matched)
         
         return tags
 
@@ -319,7 +579,8 @@ class NLPService:
             sentiment = await self.analyze_sentiment(description)
             
             # Generate insights
-            insights = self._generate_insights(transaction_data, categorization, sentiment)
+            now_hour = datetime.now().hour
+            insights = self._generate_insights(transaction_data, categorization, sentiment, now_hour)
             
             # Generate recommendations
             recommendations = self._generate_recommendations(transaction_data, categorization)
@@ -346,9 +607,10 @@ class NLPService:
         self,
         transaction_data: Dict[str, Any],
         categorization: Dict[str, Any],
-        sentiment: Dict[str, Any]
+        sentiment: Dict[str, Any],
+        now_hour: Optional[int] = None
     ) -> List[str]:
-        """Generate insights from transaction analysis"""
+        """Generate insights from transaction analysis at the given hour (defaults to now)"""
         insights = []
         
         amount = transaction_data.get("amount", 0)
@@ -359,20 +621,16 @@ class NLPService:
             insights.append("High-value transaction detected")
         
         # Category insights
-        if category == "food_dining":
-            insights.append("Dining expense - consider budgeting for meals")
-        elif category == "transportation":
-            insights.append("Transportation cost - track for tax deductions")
-        elif category == "entertainment":
-            insights.append("Entertainment expense - monitor discretionary spending")
+        insights.extend(CATEGORY_INSIGHTS.get(category, ()))
         
         # Sentiment insights
         if sentiment["sentiment"] == "negative":
             insights.append("Transaction description suggests dissatisfaction")
         
         # Time-based insights
-        hour = datetime.now().hour
-        if hour < 6 or hour > 22:
+        if now_hour is None:
+            now_hour = datetime.now().hour
+        if now_hour in LATE_HOURS:
             insights.append("Late night transaction - unusual timing")
         
         return insights
@@ -389,8 +647,7 @@ class NLPService:
         category = categorization["category"]
         
         # Budgeting recommendations
-        if category in ["food_dining", "entertainment"]:
-            recommendations.append("Consider setting a monthly budget for this category")
+        recommendations.extend(CATEGORY_RECOMMENDATIONS.get(category, ()))
         
         # Savings recommendations
         if amount > 100:
@@ -405,10 +662,10 @@ class NLPService:
     async def summarize_text(self, text: str, max_length: int = 100) -> str:
         """Summarize text"""
         try:
-            if not self.is_ready():
+            if not self.is_initialized:
                 raise Exception("NLP service not initialized")
             
-            doc = self.nlp(text)
+            doc = await asyncio.to_thread(self.sentence_nlp, text)
             
             # Extract sentences
             sentences = [sent.text for sent in doc.sents]
@@ -434,60 +691,81 @@ class NLPService:
 
     async def extract_keywords(self, text: str, max_keywords: int = 10) -> List[str]:
         """Extract keywords from text"""
+        return (await self.extract_keywords_batch([text], max_keywords))[0]
+
+    async def extract_keywords_batch(
+        self,
+        texts: List[str],
+        max_keywords: int = 10
+    ) -> List[List[str]]:
+        """Extract keywords from multiple texts in one spaCy pass"""
         try:
-            if not self.is_ready():
+            if not self.is_initialized:
                 raise Exception("NLP service not initialized")
             
-            doc = self.nlp(text)
-            
-            # Extract keywords (nouns, adjectives, proper nouns)
-            keywords = []
-            for token in doc:
-                if (token.pos_ in ['NOUN', 'ADJ', 'PROPN'] and 
-                    not token.is_stop and 
-                    not token.is_punct and 
-                    len(token.text) > 2):
-                    keywords.append(token.lemma_.lower())
-            
-            # Remove duplicates and return top keywords
-            unique_keywords = list(set(keywords))
-            return unique_keywords[:max_keywords]
+            docs = await asyncio.to_thread(self._pipe, texts, KEYWORD_DISABLED_PIPES)
+            return [self._select_keywords(doc, max_keywords) for doc in docs]
             
         except Exception as e:
             logger.error(f"Error extracting keywords: {e}")
-            return []
+            return [[] for _ in texts]
+
+    def _select_keywords(self, doc, max_keywords: int) -> List[str]:
+        """Select keywords from a processed doc"""
+        # Extract keywords (nouns, adjectives, proper nouns) from the token attribute array
+        attrs = doc.to_array(KEYWORD_ATTRS)
+        mask = (
+            np.isin(attrs[:, 1], KEYWORD_POS) &
+            (attrs[:, 2] == 0) &
+            (attrs[:, 3] == 0) &
+            (attrs[:, 4] > 2)
+        )
+        
+        # Remove duplicates and return top keywords
+        strings = doc.vocab.strings
+        unique_keywords = list({strings[int(lemma)].lower() for lemma in np.unique(attrs[mask, 0])})
+        return unique_keywords[:max_keywords]
 
     async def detect_language(self, text: str) -> str:
         """Detect language of text"""
         try:
-            # Simple language detection based on common words
-            # In production, use a proper language detection library
-            english_words = ['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by']
-            spanish_words = ['el', 'la', 'de', 'que', 'y', 'a', 'en', 'un', 'es', 'se', 'no', 'te', 'lo', 'le']
-            french_words = ['le', 'la', 'de', 'et', 'à', 'un', 'il', 'être', 'et', 'en', 'avoir', 'que', 'pour']
-            
-            text_lower = text.lower()
-            
-            english_score = sum(1 for word in english_words if word in text_lower)
-            spanish_score = sum(1 for word in spanish_words if word in text_lower)
-            french_score = sum(1 for word in french_words if word in text_lower)
-            
-            if english_score > spanish_score and english_score > french_score:
-                return "en"
-            elif spanish_score > french_score:
-                return "es"
-            elif french_score > 0:
-                return "fr"
-            else:
-                return "en"  # Default to English
+            if len(text) > self.memo_max_text_length:
+                return self._detect_language(text)
+            
+            language = self.language_cache.get(text)
+            if language is None:
+                language = self._detect_language(text)
+                self.language_cache.set(text, language)
+            
+            return language
                 
         except Exception as e:
             logger.error(f"Error detecting language: {e}")
             return "en"
 
+    def _detect_language(self, text: str) -> str:
+        """Detect language of text from its common words"""
+        # Simple language detection based on common words
+        # In production, use a proper language detection library
+        words = set(WORD_PATTERN.findall(text.lower()))
+        
+        english_score = len(words & ENGLISH_WORDS)
+        spanish_score = len(words & SPANISH_WORDS)
+        french_score = len(words & FRENCH_WORDS)
+        
+        if english_score > spanish_score and english_score > french_score:
+            return "en"
+        elif spanish_score > french_score:
+            return "es"
+        elif french_score > 0:
+            return "fr"
+        else:
+            return "en"  # Default to English
+
     async def cleanup(self):
         """Cleanup resources"""
         try:
+            self.is_initialized = False
             logger.info("NLP service cleaned up")
         except Exception as e:
             logger.error(f"Error during cleanup: {e}")
\ No newline at end of file